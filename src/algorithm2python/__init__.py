@@ -1 +1,3 @@
 __version__ = "0.1.0"
+
+from algorithm2python.decorator import algorithm
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Assemble a document with many algorithms from python sources.
+Each algorithm and its source listing go to an include file with a stable name
+and a master document \\include's all of them.
+Only include files whose content changed are rewritten and \\includeonly restricts
+the next TeX run to the parts that are newer than their .aux file, while the .aux
+files of the other parts are reused.
+"""
+import argparse
+import ast
+import os
+import re
+import sys
+
+from algorithm2python.highlight import highlight, style_defs
+from algorithm2python.prepare import preamble
+from algorithm2python.python2algorithm import render_algorithms
+
+
+def include_name(path: str) -> str:
+    """
+    Stable name of the include file of a source.
+    \\include does not like spaces, dots or underscores so map everything else to -.
+    """
+    stem = os.path.splitext(os.path.relpath(path))[0]
+    return re.sub(r"[^A-Za-z0-9]+", "-", stem).strip("-")
+
+
+def include_file(body: str, source: str) -> str:
+    return (
+        "\\begin{paracol}{2}\n"
+        + "\\begin{algorithm}\n"
+        + body
+        + "\n\\end{algorithm}\n"
+        + "\\switchcolumn\n"
+        + highlight(source)
+        + "\\end{paracol}\n"
+    )
+
+
+def master_file(declarations: str, names: list[str], only: list[str] | None) -> str:
+    lines = [preamble, declarations, style_defs()]
+    if only is not None:
+        lines.append("\\includeonly{" + ",".join(only) + "}\n")
+    lines.append("\\begin{document}\n\\maketitle\n")
+    for name in names:
+        lines.append("\\include{" + name + "}\n")
+    lines.append("\\end{document}\n")
+    return "".join(lines)
+
+
+def _write_if_changed(path: str, content: str) -> bool:
+    try:
+        with open(path) as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, "w") as f:
+        f.write(content)
+    return True
+
+
+def _stale(tex: str, aux: str) -> bool:
+    """Whether TeX has not processed the include file since it was last written"""
+    try:
+        aux_mtime = os.stat(aux).st_mtime_ns
+    except FileNotFoundError:
+        return True
+    # Equal times can't be ordered so process the part again
+    return os.stat(tex).st_mtime_ns >= aux_mtime
+
+
+def assemble(
+    sources: list[str],
+    outdir: str,
+    master: str = "main",
+    auxdir: str | None = None,
+    full: bool = False,
+) -> list[str]:
+    """
+    Write the include files and the master document to outdir.
+    auxdir is where TeX puts the .aux files (outdir by default).
+    A part is reprocessed if its include file is newer than its .aux file or it has none yet,
+    so parts stay stale until TeX has actually processed them.
+    If all or none of the parts need to be processed or full is set no \\includeonly is written.
+    Returns the names of the stale parts.
+    Note that TeX leaves the parts not in \\includeonly out of the pdf.
+    """
+    auxdir = outdir if auxdir is None else auxdir
+    os.makedirs(outdir, exist_ok=True)
+    texts = []
+    for path in sources:
+        with open(path) as f:
+            texts.append(f.read())
+    names = [include_name(path) for path in sources]
+    if len(set(names)) != len(names):
+        raise ValueError("Sources map to the same include name")
+    declarations, bodies = render_algorithms([ast.parse(text, mode="exec") for text in texts])
+
+    stale = []
+    for name, body, text in zip(names, bodies, texts):
+        tex = os.path.join(outdir, name + ".tex")
+        _write_if_changed(tex, include_file(body, text))
+        if _stale(tex, os.path.join(auxdir, name + ".aux")):
+            stale.append(name)
+
+    # An empty \\includeonly would give an empty document
+    only = None if full or len(stale) in (0, len(names)) else stale
+    _write_if_changed(
+        os.path.join(outdir, master + ".tex"), master_file(declarations, names, only)
+    )
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("outdir")
+    parser.add_argument("sources", nargs="+")
+    parser.add_argument("--master", default="main")
+    parser.add_argument(
+        "--auxdir", help="where TeX writes the .aux files, e.g. its -output-directory (outdir by default)"
+    )
+    parser.add_argument("--full", action="store_true", help="do not write \\includeonly")
+    args = parser.parse_args()
+    for name in assemble(args.sources, args.outdir, args.master, args.auxdir, args.full):
+        print(name, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import ast
+import functools
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class FragmentCache:
+    """
+    Bounded LRU cache for rendered LaTeX fragments.
+    Mirrors functools.lru_cache: maxsize=None is unbounded and maxsize=0 disables caching.
+    """
+
+    def __init__(self, maxsize: int | None = 1024) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Interned node shapes, see ShapeHasher
+        self._shapes = {}
+        self._next_shape = 0
+
+    def get(self, key) -> Any:
+        """Return the cached value for key or None and count the lookup"""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value) -> None:
+        if self.maxsize == 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if self.maxsize is not None and len(self._entries) > self.maxsize:
+            # Evict the least recently used entry
+            self._entries.popitem(last=False)
+
+    def intern(self, key: tuple) -> int:
+        shape = self._shapes.get(key)
+        if shape is None:
+            if self.maxsize is not None and len(self._shapes) >= 16 * max(self.maxsize, 1):
+                # Ids are never reused, entries of forgotten shapes are just not found anymore
+                self._shapes.clear()
+            shape = self._shapes[key] = self._next_shape
+            self._next_shape += 1
+        return shape
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._shapes.clear()
+        self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """
+    Persistent cache in a directory, one file per entry named after the hash of the key.
+    It survives between builds and can be shared by parallel processes:
+    entries are written to a temporary file first and then renamed, so a reader never sees a partial entry.
+    Statistics are counted per process.
+    """
+
+    def __init__(self, directory: str, suffix: str = "") -> None:
+        self.directory = directory
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, name + self.suffix)
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            with open(self.path(key), "rb") as f:
+                value = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        path = self.path(key)
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+    def info(self) -> CacheInfo:
+        try:
+            currsize = sum(1 for n in os.listdir(self.directory) if n.endswith(self.suffix))
+        except FileNotFoundError:
+            currsize = 0
+        return CacheInfo(self.hits, self.misses, None, currsize)
+
+
+@functools.cache
+def source_hash(module) -> str:
+    """
+    Hash of the source file of a module.
+    Put it in persistent cache keys so entries are invalidated when the module changes,
+    the package version is not bumped for every fix.
+    """
+    with open(module.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class ShapeHasher:
+    """
+    Maps AST nodes to a structural hash.
+    Two nodes have the same shape if they have the same type and fields, ignoring positions.
+    Shapes are hash-consed: a node's key is its type and the shape ids of its children,
+    which the cache interns to a small integer. Every node is hashed once bottom up and the id
+    is remembered, so asking for the shape of a parent does not traverse its children again.
+    """
+
+    def __init__(self, cache: "FragmentCache") -> None:
+        self._cache = cache
+        # id(node) -> (node, shape). The node is kept so the id can't be reused.
+        self._shapes = {}
+
+    def __call__(self, node: ast.AST) -> int:
+        entry = self._shapes.get(id(node))
+        if entry is not None:
+            return entry[1]
+        key = [type(node)]
+        for field in node._fields:
+            value = getattr(node, field, None)
+            if isinstance(value, ast.AST):
+                key.append(self(value))
+            elif isinstance(value, list):
+                key.append(tuple(self(v) if isinstance(v, ast.AST) else _leaf(v) for v in value))
+            else:
+                key.append(_leaf(value))
+        shape = self._cache.intern(tuple(key))
+        self._shapes[id(node)] = (node, shape)
+        return shape
+
+    def clear(self) -> None:
+        self._shapes.clear()
+
+
+def _leaf(value) -> tuple:
+    # Include the type so that 1, 1.0 and True get different shapes, repr tells 0.0 and -0.0 apart
+    return (type(value), repr(value) if isinstance(value, float) else value)
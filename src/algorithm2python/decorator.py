@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+The @algorithm decorator marks functions to be rendered as algorithm2e pseudocode on demand.
+Decorating only wraps the function. The source is retrieved and translated the
+first time __latex__ is accessed, so importing a decorated module stays as fast as before.
+"""
+import functools
+import os
+import types
+
+
+class Algorithm:
+    """Callable wrapper around a function that renders it lazily"""
+
+    def __init__(self, func) -> None:
+        functools.update_wrapper(self, func)
+        self._latex = None
+        self._stamp = None
+
+    def __call__(self, *args, **kwargs):
+        return self.__wrapped__(*args, **kwargs)
+
+    def __get__(self, instance, owner=None):
+        # Behave like a function when used as a method, the bound method forwards __latex__ to us
+        if instance is None:
+            return self
+        return types.MethodType(self, instance)
+
+    def _source_stamp(self):
+        """Changes whenever the file the function is defined in changes"""
+        filename = self.__wrapped__.__code__.co_filename
+        try:
+            st = os.stat(filename)
+        except OSError:
+            # Defined interactively, the source can't change without redefining the function
+            return None
+        return (filename, st.st_mtime_ns, st.st_size)
+
+    def _source(self) -> str:
+        """
+        The current source of the function in its file.
+        It is looked up by qualified name in the file as it is now, the line numbers
+        of the loaded code object are out of date once lines above it changed.
+        Note that calls still run the function that was imported.
+        """
+        import ast
+        import inspect
+        import textwrap
+
+        func = self.__wrapped__
+        if self._source_stamp() is None or "<locals>" in func.__qualname__:
+            return textwrap.dedent(inspect.getsource(func))
+        with open(func.__code__.co_filename) as f:
+            text = f.read()
+        node = ast.parse(text)
+        for name in func.__qualname__.split("."):
+            for child in node.body:
+                if (
+                    isinstance(child, ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef)
+                    and child.name == name
+                ):
+                    node = child
+                    break
+            else:
+                raise ValueError(f"{func.__qualname__} not found in {func.__code__.co_filename}")
+        return textwrap.dedent(ast.get_source_segment(text, node, padded=True))
+
+    def render(self) -> str:
+        import ast
+        import io
+
+        from algorithm2python.python2algorithm import Python2Algorithm
+
+        source = self._source()
+        out = io.StringIO()
+        Python2Algorithm(output=out).visit(ast.parse(source, mode="exec"))
+        return out.getvalue()
+
+    @property
+    def __latex__(self) -> str:
+        stamp = self._source_stamp()
+        if self._latex is None or stamp != self._stamp:
+            self._latex = self.render()
+            self._stamp = stamp
+        return self._latex
+
+
+def algorithm(func):
+    """
+    Decorator to render a function as pseudocode, e.g.
+
+    @algorithm
+    def euler_tour(graph):
+        ...
+
+    euler_tour.__latex__
+    """
+    return Algorithm(func)
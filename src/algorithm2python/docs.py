@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Render algorithms for documentation builds.
+A target is written as pkg.mod:func or pkg.mod:Class.method. Its source is read from the
+module file without running the module. Translations and previews are kept in a DiskCache
+keyed on the source of the function and the options, so a docs build only re-renders what
+changed and parallel docs workers share the results.
+See algorithm2python.sphinxext for the Sphinx directive.
+"""
+import ast
+import importlib.util
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import textwrap
+
+from algorithm2python import __version__, prepare, python2algorithm
+from algorithm2python.cache import DiskCache, source_hash
+from algorithm2python.prepare import preamble
+from algorithm2python.python2algorithm import Python2Algorithm
+
+CACHE_DIR = ".algorithm2python-cache/docs"
+
+# path -> (mtime_ns, size, text, tree) so several targets in one module parse it once
+_modules = {}
+
+
+def _parse(path: str) -> tuple[str, ast.Module]:
+    st = os.stat(path)
+    entry = _modules.get(path)
+    if entry is None or entry[:2] != (st.st_mtime_ns, st.st_size):
+        with open(path) as f:
+            text = f.read()
+        entry = (st.st_mtime_ns, st.st_size, text, ast.parse(text, filename=path))
+        _modules[path] = entry
+    return entry[2], entry[3]
+
+
+def find_source(target: str) -> tuple[str, str]:
+    """Return the path of the module and the dedented source of the function target refers to"""
+    module, _, qualname = target.partition(":")
+    if not module or not qualname:
+        raise ValueError(f"Expected module:function, got {target!r}")
+    # Note that this imports the parent packages
+    spec = importlib.util.find_spec(module)
+    if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+        raise ValueError(f"No python source for module {module}")
+    text, node = _parse(spec.origin)
+    for name in qualname.split("."):
+        for child in node.body:
+            if (
+                isinstance(child, ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef)
+                and child.name == name
+            ):
+                node = child
+                break
+        else:
+            raise ValueError(f"{qualname} not found in {module}")
+    if not isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef):
+        raise ValueError(f"{target} is not a function")
+    return spec.origin, textwrap.dedent(ast.get_source_segment(text, node, padded=True))
+
+
+def translate(source: str, options: dict) -> str:
+    """The algorithm environment for the source of a function"""
+    out = io.StringIO()
+    Python2Algorithm(output=out).visit(ast.parse(source, mode="exec"))
+    caption = options.get("caption")
+    return (
+        "\\begin{algorithm}\n"
+        + ("\\caption{" + caption + "}\n" if caption else "")
+        + out.getvalue()
+        + "\n\\end{algorithm}\n"
+    )
+
+
+def preview_document(latex: str) -> str:
+    return preamble + "\\begin{document}\n\\pagestyle{empty}\n" + latex + "\\end{document}\n"
+
+
+def compile_pdf(document: str) -> bytes:
+    if shutil.which("pdflatex") is None:
+        raise RuntimeError("pdflatex is needed for previews")
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "preview.tex"), "w") as f:
+            f.write(document)
+        result = subprocess.run(
+            ["pdflatex", "-interaction=nonstopmode", "-halt-on-error", "preview.tex"],
+            cwd=tmp,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError("pdflatex failed:\n" + result.stdout[-2000:])
+        with open(os.path.join(tmp, "preview.pdf"), "rb") as f:
+            return f.read()
+
+
+class Renderer:
+    """Renders targets through the persistent cache"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR) -> None:
+        self.latex_cache = DiskCache(cache_dir, suffix=".tex")
+        self.pdf_cache = DiskCache(cache_dir, suffix=".pdf")
+
+    @staticmethod
+    def key(source: str, options: dict) -> str:
+        translator = source_hash(python2algorithm)
+        return json.dumps([__version__, translator, source, options], sort_keys=True)
+
+    def render(self, target: str, options: dict | None = None) -> str:
+        """The algorithm environment of target"""
+        options = options or {}
+        _, source = find_source(target)
+        key = self.key(source, options)
+        latex = self.latex_cache.get(key)
+        if latex is not None:
+            return latex.decode()
+        latex = translate(source, options)
+        self.latex_cache.put(key, latex.encode())
+        return latex
+
+    def preview(self, target: str, options: dict | None = None, latex: str | None = None) -> bytes:
+        """A pdf with only the algorithm of target, pass latex if it was already rendered"""
+        options = options or {}
+        _, source = find_source(target)
+        # The pdf also depends on the document preamble
+        key = self.key(source, options) + "\0" + source_hash(prepare)
+        pdf = self.pdf_cache.get(key)
+        if pdf is None:
+            if latex is None:
+                latex = self.render(target, options)
+            pdf = compile_pdf(preview_document(latex))
+            self.pdf_cache.put(key, pdf)
+        return pdf
+
+    def stats(self) -> tuple[int, int]:
+        """Number of cache hits and misses in this process"""
+        hits = self.latex_cache.hits + self.pdf_cache.hits
+        misses = self.latex_cache.misses + self.pdf_cache.misses
+        return hits, misses
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Highlight python source to LaTeX in-process.
+This replaces minted which needs pdflatex -shell-escape and spawns pygmentize on every compile.
+The highlighted fragments only depend on the source so they are cached on disk by content hash.
+"""
+from algorithm2python.cache import DiskCache
+
+try:
+    import pygments
+    from pygments.formatters import LatexFormatter
+    from pygments.lexers import PythonLexer
+except ImportError:  # Fall back to an uncolored listing
+    pygments = None
+
+STYLE = "default"
+CACHE_DIR = ".algorithm2python-cache/highlight"
+
+
+def _formatter(style: str):
+    return LatexFormatter(style=style)
+
+
+def style_defs(style: str = STYLE) -> str:
+    """Preamble needed by the highlighted fragments"""
+    packages = "\\usepackage{fancyvrb}\n"
+    if pygments is None:
+        return packages
+    return packages + _formatter(style).get_style_defs() + "\n"
+
+
+def cache_key(source: str, style: str = STYLE) -> str:
+    # The output also depends on the pygments version
+    version = pygments.__version__ if pygments is not None else "plain"
+    return f"{version}\0{style}\0{source}"
+
+
+def highlight_source(source: str, style: str = STYLE) -> str:
+    """Return a fancyvrb Verbatim environment containing the (highlighted) source"""
+    if pygments is None:
+        return "\\begin{Verbatim}\n" + source.rstrip("\n") + "\n\\end{Verbatim}\n"
+    return pygments.highlight(source, PythonLexer(), _formatter(style))
+
+
+def highlight(source: str, style: str = STYLE, cache_dir: str | None = CACHE_DIR) -> str:
+    """
+    Like highlight_source but the result is looked up in cache_dir first.
+    Pass cache_dir=None to always highlight.
+    """
+    if cache_dir is None:
+        return highlight_source(source, style)
+    cache = DiskCache(cache_dir, suffix=".tex")
+    key = cache_key(source, style)
+    fragment = cache.get(key)
+    if fragment is not None:
+        return fragment.decode()
+    fragment = highlight_source(source, style)
+    cache.put(key, fragment.encode())
+    return fragment
+
+
+def highlight_file(path: str, style: str = STYLE, cache_dir: str | None = CACHE_DIR) -> str:
+    with open(path) as f:
+        return highlight(f.read(), style, cache_dir)
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Convert the code cells of Jupyter notebooks to algorithms.
+Every cell becomes one algorithm in a .tex file per notebook, captioned and labeled with its cell number.
+Translations are cached per cell by content hash, so re-running on a notebook with one
+edited cell only translates that cell. Cells that miss the cache are translated in parallel.
+"""
+import argparse
+import ast
+import io
+import json
+import os
+import sys
+import tokenize
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from algorithm2python import __version__, python2algorithm
+from algorithm2python.cache import DiskCache, source_hash
+from algorithm2python.prepare import preamble
+from algorithm2python.python2algorithm import Python2Algorithm
+
+CACHE_DIR = ".algorithm2python-cache/notebook"
+
+
+class Cell(NamedTuple):
+    # Position in the notebook, counting all cells
+    index: int
+    id: str | None
+    source: str
+
+
+class CellAlgorithm(NamedTuple):
+    cell: Cell
+    latex: str | None
+    # Set if the cell could not be translated
+    error: str | None = None
+
+
+def code_cells(path: str, tag: str | None = None) -> list[Cell]:
+    """The code cells of a notebook, only those tagged with tag if given"""
+    with open(path) as f:
+        nb = json.load(f)
+    cells = []
+    for index, cell in enumerate(nb.get("cells", [])):
+        if cell.get("cell_type") != "code":
+            continue
+        if tag is not None and tag not in cell.get("metadata", {}).get("tags", []):
+            continue
+        source = cell.get("source", "")
+        if isinstance(source, list):
+            source = "".join(source)
+        if source.strip():
+            cells.append(Cell(index, cell.get("id"), source))
+    return cells
+
+
+def _complete(lines: list[str]) -> bool:
+    """Whether lines end outside of brackets, strings and continuation lines"""
+    try:
+        for _ in tokenize.generate_tokens(io.StringIO("".join(lines)).readline):
+            pass
+    except tokenize.TokenError:
+        return False
+    except SyntaxError:
+        # Left for ast.parse to report
+        pass
+    return True
+
+
+def _strip_magics(source: str) -> str:
+    """
+    Comment out IPython magics and shell escapes, which are not python.
+    Only lines that start a logical line are magics, a % or ! inside brackets or strings is kept.
+    """
+    lines = source.splitlines(keepends=True)
+    if not any(line.lstrip().startswith(("%", "!")) for line in lines):
+        return source
+    out = []
+    # The physical lines of the logical line being read
+    pending = []
+    for line in lines:
+        if not pending and line.lstrip().startswith(("%", "!")):
+            out.append("#" + line)
+            continue
+        pending.append(line)
+        if _complete(pending):
+            out += pending
+            pending = []
+    return "".join(out + pending)
+
+
+def translate_cell(source: str) -> tuple[str | None, str | None]:
+    """(latex, error) for the source of a cell"""
+    try:
+        tree = ast.parse(_strip_magics(source), mode="exec")
+        out = io.StringIO()
+        Python2Algorithm(output=out).visit(tree)
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    return out.getvalue(), None
+
+
+def translate_cells(
+    cells: list[Cell], cache: DiskCache | None = None, workers: int | None = None
+) -> list[CellAlgorithm]:
+    cache = DiskCache(CACHE_DIR, suffix=".json") if cache is None else cache
+    # The version is not bumped for translator fixes
+    translator = source_hash(python2algorithm)
+    keys = [f"{__version__}\0{translator}\0{cell.source}" for cell in cells]
+    results = {}
+    todo = {}
+    for cell, key in zip(cells, keys):
+        # Identical cells are translated once
+        if key in results or key in todo:
+            continue
+        hit = cache.get(key)
+        if hit is None:
+            todo[key] = cell
+        else:
+            results[key] = tuple(json.loads(hit))
+
+    sources = [cell.source for cell in todo.values()]
+    workers = workers or os.cpu_count() or 1
+    # Starting processes costs more than translating a few cells
+    if workers == 1 or len(sources) < 16:
+        translated = [translate_cell(s) for s in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            translated = list(pool.map(translate_cell, sources, chunksize=4))
+    for key, result in zip(todo, translated):
+        results[key] = result
+        cache.put(key, json.dumps(result).encode())
+    return [CellAlgorithm(cell, *results[key]) for cell, key in zip(cells, keys)]
+
+
+def notebook_document(name: str, algorithms: list[CellAlgorithm]) -> str:
+    lines = [preamble, "\\begin{document}\n"]
+    for a in algorithms:
+        lines.append(f"% cell {a.cell.index}" + (f" id {a.cell.id}" if a.cell.id else "") + "\n")
+        if a.error is not None:
+            lines.append(f"% not translated: {a.error}\n")
+            continue
+        lines += [
+            "\\begin{algorithm}\n",
+            f"\\caption{{Cell {a.cell.index}}}\n",
+            f"\\label{{cell:{name}:{a.cell.index}}}\n",
+            a.latex,
+            "\n\\end{algorithm}\n",
+        ]
+    lines.append("\\end{document}\n")
+    return "".join(lines)
+
+
+def convert(
+    path: str,
+    outdir: str,
+    tag: str | None = None,
+    cache: DiskCache | None = None,
+    workers: int | None = None,
+) -> list[CellAlgorithm]:
+    """Write outdir/<notebook name>.tex and return the algorithm of every cell"""
+    name = os.path.splitext(os.path.basename(path))[0]
+    algorithms = translate_cells(code_cells(path, tag), cache, workers)
+    os.makedirs(outdir, exist_ok=True)
+    with open(os.path.join(outdir, name + ".tex"), "w") as f:
+        f.write(notebook_document(name, algorithms))
+    return algorithms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("notebooks", nargs="+")
+    parser.add_argument("-o", "--outdir", default=".")
+    parser.add_argument("--tag", help="only convert cells with this tag")
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    args = parser.parse_args()
+    cache = DiskCache(CACHE_DIR, suffix=".json")
+    for path in args.notebooks:
+        for a in convert(path, args.outdir, args.tag, cache, args.jobs):
+            if a.error is not None:
+                print(f"{path}: cell {a.cell.index}: {a.error}", file=sys.stderr)
+    info = cache.info()
+    print(f"{info.hits} cells cached, {info.misses} translated", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
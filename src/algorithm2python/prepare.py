@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
+from algorithm2python.highlight import highlight_file, style_defs
 
 # TODO make configurable
 options = "linesnumbered,lined,boxed,commentsnumbered"
+source = "src/sample/bench.py"
 
-header = (
+preamble = (
     r"\documentclass{article}"
     + r"\usepackage["
     + options
     + "]{algorithm2e}"
     + r"""
-\usepackage{minted}
 \usepackage{paracol}
 \usepackage[usenames]{color}
 \usepackage{amsmath}
@@ -22,11 +23,14 @@ header = (
 \geometry{left=3.0cm,right=3.0cm,top=1.0cm,bottom=1.0cm,columnsep=1.0cm}
 \title{Python2Algorithm}
 \author{Ali G.}
+"""
+)
+# The listing is highlighted in-process so neither minted nor -shell-escape are needed
+begin = r"""
 \begin{document}
 \maketitle
 \begin{paracol}{2}
 """
-)
 footer = r"""
 \end{paracol}
 \end{document}
@@ -46,7 +50,9 @@ footer = r"""
 
 
 def main():
-    print(header)
+    print(preamble)
+    print(style_defs())
+    print(begin)
     try:
         print(r"\begin{algorithm}")
         while line := input():
@@ -56,7 +62,7 @@ def main():
     finally:
         print(r"\end{algorithm}")
     print(r"\switchcolumn")
-    print(r"\inputminted{python3}{src/sample/bench.py}")
+    print(highlight_file(source))
     print(footer)
 
 
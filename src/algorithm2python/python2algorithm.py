@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import ast
+import io
 import sys
 from decimal import Decimal
 from fractions import Fraction  # TODO support display like this
 from typing import Any
 
+from algorithm2python.cache import FragmentCache, ShapeHasher
 
 ignores = dir(__builtins__)
 # type_comment and ignore_types fields
@@ -27,6 +29,22 @@ ignores = dir(__builtins__)
 MATH = 1
 NOMATH = -1
 
+# Expressions that are rendered once and then replayed from the fragment cache.
+# Leaves like Name and Constant are cheaper to print than to look up.
+_MEMOIZED = (
+    ast.BinOp,
+    ast.BoolOp,
+    ast.Call,
+    ast.Compare,
+    ast.Subscript,
+    ast.Attribute,
+    ast.UnaryOp,
+    ast.Set,
+    ast.Tuple,
+    ast.List,
+    ast.Dict,
+)
+
 
 class Python2Algorithm(ast.NodeVisitor):
     """
@@ -56,9 +74,23 @@ class Python2Algorithm(ast.NodeVisitor):
     # and also reduce the number of characters needed.
     # $x$ + $y$ -> $x + y$
 
-    def __init__(self, output=sys.stdout) -> None:
+    def __init__(
+        self,
+        output=sys.stdout,
+        cache: FragmentCache | None = None,
+        preamble: "KeywordPreamble | None" = None,
+    ) -> None:
+        """
+        If a FragmentCache is given rendered subexpressions are memoized in it, keyed on their shape
+        and on whether we are in an equation. Without one every node is printed directly, which is
+        faster unless fragments are shared across many instances.
+        If a KeywordPreamble is given only the keywords it does not declare are defined inside the algorithm.
+        """
         super().__init__()
         self._output_file = output
+        self.preamble = preamble
+        self.cache = cache
+        self._shape = ShapeHasher(cache) if cache is not None and cache.maxsize != 0 else None
 
     def define_Functions_First(self, node: ast.AST):
         """
@@ -72,19 +104,14 @@ class Python2Algorithm(ast.NodeVisitor):
         kwe = KwFunctionExtractor()
         kwe.visit(node)
 
-        # Define additional keywords
-        self._print("\\SetKw{Yield}{yield}\n")
-        self._print("\\SetKw{YieldFrom}{yield from}\n")
-        self._print("\\SetKw{Break}{break}\n")
-        self._print("\\SetKw{Continue}{continue}\n")
-        self._print("\\SetKw{Pass}{pass}\n")
-
-        # TODO SetKwData: what?
-
-        if kwe.needs:
-            self._print("\\SetKwProg{Fn}{Function}{:}{end}\n")
-        for f in kwe.needs:
-            self._print("\\SetKwFunction{" + f + "}{" + f + "}\n")
+        if self.preamble is None:
+            # Define additional keywords
+            for line in keyword_declarations(kwe.needs):
+                self._print(line)
+        else:
+            # Only declare what the shared document preamble does not already provide
+            for line in self.preamble.local_declarations(kwe.needs):
+                self._print(line)
 
     def visit_Module(self, node: ast.Module):
         self.define_Functions_First(node)
@@ -118,8 +145,36 @@ class Python2Algorithm(ast.NodeVisitor):
                 self._print("\n" + self._INDENTATION * self.level, end="")
             self._lineno = node.lineno
             self._suppress_semicolon = False
+        if self._shape is not None and isinstance(node, _MEMOIZED) and self._on_current_line(node):
+            return self._visit_memoized(node)
         return super().visit(node)
 
+    def _on_current_line(self, node: ast.AST) -> bool:
+        """
+        A fragment can only be replayed if rendering it never emits a line break.
+        That is the case if the whole node lies on the line we are currently writing.
+        """
+        end_lineno = getattr(node, "end_lineno", None)
+        return end_lineno is not None and end_lineno <= self._lineno
+
+    def _visit_memoized(self, node: ast.AST):
+        # The rendering only depends on the shape of the node and the math mode we start in
+        key = (self._shape(node), self.in_equation)
+        hit = self.cache.get(key)
+        if hit is not None:
+            fragment, self.in_equation = hit
+            print(fragment, end="", file=self._output_file)
+            return
+        output = self._output_file
+        self._output_file = io.StringIO()
+        try:
+            super().visit(node)
+            fragment = self._output_file.getvalue()
+        finally:
+            self._output_file = output
+        self.cache.put(key, (fragment, self.in_equation))
+        print(fragment, end="", file=self._output_file)
+
     def _print(self, value: str, math=None, end=" ", *kwarg, **kwargs):
         """
         Internal print wrapper to print latex output.
@@ -626,6 +681,75 @@ class Python2Algorithm(ast.NodeVisitor):
         # self._print(r"}", math=NOMATH)
 
 
+# Keywords that are not predefined by algorithm2e
+KEYWORDS = {
+    "Yield": "yield",
+    "YieldFrom": "yield from",
+    "Break": "break",
+    "Continue": "continue",
+    "Pass": "pass",
+}
+
+
+def keyword_declarations(functions, keywords=True) -> list[str]:
+    """The \\SetKw... lines needed by an algorithm that calls or defines functions"""
+    lines = []
+    if keywords:
+        for kw, text in KEYWORDS.items():
+            lines.append("\\SetKw{" + kw + "}{" + text + "}\n")
+    # TODO SetKwData: what?
+    if functions:
+        lines.append("\\SetKwProg{Fn}{Function}{:}{end}\n")
+    # Sorted so that the same algorithm always produces the same output
+    for f in sorted(functions):
+        lines.append("\\SetKwFunction{" + f + "}{" + f + "}\n")
+    return lines
+
+
+class KeywordPreamble:
+    """
+    Keyword declarations shared by all algorithms of a document.
+    In a document with many algorithms the same keywords and functions (e.g. Print) would be declared
+    over and over again. Instead collect() every algorithm first, put declarations() once in the preamble
+    and pass this object to Python2Algorithm which then only declares what was not collected.
+    """
+
+    def __init__(self) -> None:
+        self.functions = set()
+
+    def collect(self, node: ast.AST):
+        kwe = KwFunctionExtractor()
+        kwe.visit(node)
+        self.functions |= kwe.needs
+
+    def declarations(self) -> str:
+        return "".join(keyword_declarations(self.functions))
+
+    def local_declarations(self, needs) -> list[str]:
+        missing = set(needs) - self.functions
+        lines = keyword_declarations(missing, keywords=False)
+        if not self.functions:
+            # The shared block has no \\SetKwProg so keep the local one
+            return lines
+        return [line for line in lines if not line.startswith("\\SetKwProg")]
+
+
+def render_algorithms(trees, cache: FragmentCache | None = None) -> tuple[str, list[str]]:
+    """
+    Translate several modules for one document.
+    Returns the shared keyword declarations and the body of each algorithm.
+    """
+    preamble = KeywordPreamble()
+    for tree in trees:
+        preamble.collect(tree)
+    bodies = []
+    for tree in trees:
+        out = io.StringIO()
+        Python2Algorithm(output=out, cache=cache, preamble=preamble).visit(tree)
+        bodies.append(out.getvalue())
+    return preamble.declarations(), bodies
+
+
 def normalize_function_name(func: str):
     return func.replace("_", "").capitalize()
 
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Render the algorithms changed between two git revisions side by side.
+Only files git reports as changed are read from the object store, and in those
+only functions that were added or whose content changed are translated.
+Functions are matched by qualified name (Class.method) and compared by a hash
+of their AST, so formatting and comment changes are ignored.
+"""
+import argparse
+import ast
+import hashlib
+import io
+import subprocess
+import sys
+from typing import NamedTuple
+
+from algorithm2python.prepare import preamble
+from algorithm2python.python2algorithm import KeywordPreamble, Python2Algorithm
+
+
+class Change(NamedTuple):
+    path: str
+    qualname: str
+    # One of added, modified, removed or skipped
+    status: str
+    old: ast.FunctionDef | None
+    new: ast.FunctionDef | None
+    # Why a file was skipped
+    error: str | None = None
+
+
+def _git(repo: str, *args: str, input: bytes | None = None) -> bytes:
+    return subprocess.run(
+        ["git", "-C", repo, *args], input=input, capture_output=True, check=True
+    ).stdout
+
+
+def changed_files(old: str, new: str, repo: str = ".") -> list[tuple[str, str]]:
+    """(status, path) of the python files that differ, git only compares the trees that changed"""
+    out = _git(repo, "diff", "--name-status", "--no-renames", "-z", old, new, "--", "*.py")
+    fields = out.decode().split("\0")
+    return [(fields[i], fields[i + 1]) for i in range(0, len(fields) - 1, 2)]
+
+
+def read_blobs(specs: list[str], repo: str = ".") -> dict[str, bytes | None]:
+    """Read rev:path specs with a single git cat-file process, missing ones are None"""
+    if not specs:
+        return {}
+    out = _git(repo, "cat-file", "--batch", input="".join(s + "\n" for s in specs).encode())
+    blobs = {}
+    pos = 0
+    for spec in specs:
+        end = out.index(b"\n", pos)
+        header = out[pos:end].split()
+        pos = end + 1
+        if header[-1] == b"missing":
+            blobs[spec] = None
+            continue
+        size = int(header[2])
+        # Left undecoded, ast.parse honors the encoding declaration
+        blobs[spec] = out[pos : pos + size]
+        # The content is followed by a newline
+        pos += size + 1
+    return blobs
+
+
+def functions(source: str | bytes | None) -> dict[str, tuple[str, ast.FunctionDef]]:
+    """Qualified name -> (content hash, node) of the functions and methods of a module"""
+    if source is None:
+        return {}
+    found = {}
+    stack = [("", node) for node in ast.parse(source).body]
+    while stack:
+        prefix, node = stack.pop()
+        if isinstance(node, ast.ClassDef):
+            stack.extend((prefix + node.name + ".", n) for n in node.body)
+        elif isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef):
+            # ast.dump leaves out positions
+            digest = hashlib.sha256(ast.dump(node).encode()).hexdigest()
+            found[prefix + node.name] = (digest, node)
+    return found
+
+
+def diff(old: str, new: str, repo: str = ".") -> list[Change]:
+    files = changed_files(old, new, repo)
+    specs = []
+    for _, path in files:
+        specs += [f"{old}:{path}", f"{new}:{path}"]
+    blobs = read_blobs(specs, repo)
+    changes = []
+    for _, path in files:
+        try:
+            before = functions(blobs[f"{old}:{path}"])
+            after = functions(blobs[f"{new}:{path}"])
+        except (SyntaxError, ValueError) as e:
+            # E.g. python 2 files or broken fixtures, the other files are still diffed
+            changes.append(Change(path, "", "skipped", None, None, f"{type(e).__name__}: {e}"))
+            continue
+        for name in sorted(before.keys() | after.keys()):
+            if name not in before:
+                changes.append(Change(path, name, "added", None, after[name][1]))
+            elif name not in after:
+                changes.append(Change(path, name, "removed", before[name][1], None))
+            elif before[name][0] != after[name][0]:
+                changes.append(Change(path, name, "modified", before[name][1], after[name][1]))
+    return changes
+
+
+def _column(node: ast.FunctionDef | None, keywords: KeywordPreamble) -> str:
+    if node is None:
+        return ""
+    out = io.StringIO()
+    try:
+        Python2Algorithm(output=out, preamble=keywords).visit(
+            ast.Module(body=[node], type_ignores=[])
+        )
+    except Exception as e:
+        # Unsupported constructs should not hide the rest of the changes
+        return "\\textit{Translation failed: " + type(e).__name__ + "}\n"
+    return "\\begin{algorithm}\n" + out.getvalue() + "\n\\end{algorithm}\n"
+
+
+def render(changes: list[Change]) -> str:
+    """A document with the old version on the left and the new one on the right"""
+    shown = [c for c in changes if c.status not in ("removed", "skipped")]
+    keywords = KeywordPreamble()
+    for c in shown:
+        for node in (c.old, c.new):
+            if node is not None:
+                keywords.collect(node)
+    lines = [preamble, keywords.declarations(), "\\begin{document}\n"]
+    for c in shown:
+        old = _column(c.old, keywords)
+        new = _column(c.new, keywords)
+        title = f"{c.qualname} ({c.path}, {c.status})".replace("_", "\\_")
+        lines += [
+            "\\section*{" + title + "}\n",
+            "\\begin{paracol}{2}\n",
+            old,
+            "\\switchcolumn\n",
+            new,
+            "\\end{paracol}\n",
+        ]
+    removed = [c for c in changes if c.status == "removed"]
+    if removed:
+        lines.append("\\section*{Removed}\n\\begin{itemize}\n")
+        for c in removed:
+            lines.append(f"\\item {c.qualname} ({c.path})\n".replace("_", "\\_"))
+        lines.append("\\end{itemize}\n")
+    skipped = [c for c in changes if c.status == "skipped"]
+    if skipped:
+        lines.append("\\section*{Skipped}\n\\begin{itemize}\n")
+        for c in skipped:
+            lines.append("\\item " + f"{c.path} could not be parsed\n".replace("_", "\\_"))
+        lines.append("\\end{itemize}\n")
+    lines.append("\\end{document}\n")
+    return "".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--repo", default=".")
+    args = parser.parse_args()
+    changes = diff(args.old, args.new, args.repo)
+    print(render(changes))
+    for c in changes:
+        if c.status == "skipped":
+            print(f"skipped {c.path}: {c.error}", file=sys.stderr)
+        else:
+            print(f"{c.status} {c.path}:{c.qualname}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,657 @@
+#!/usr/bin/env python3
+"""
+Translate algorithm2e back to python for round trip verification.
+Only the subset that Python2Algorithm emits is understood.
+The re-parsed AST is compared node by node with the original after normalizing the losses the
+translation is known to have:
+- method receivers are not printed,
+- function names are printed without underscores and capitalized,
+- the module docstring is cleaned up and
+- set() of a literal is printed as a set.
+Anything else that differs, e.g. dropped parentheses, is reported as a failure.
+"""
+import argparse
+import ast
+import copy
+import io
+import re
+import sys
+from typing import NamedTuple
+
+from algorithm2python.cache import FragmentCache
+from algorithm2python.python2algorithm import Python2Algorithm, normalize_function_name
+
+
+class ParseError(ValueError):
+    pass
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+
+
+# Whitespace and math delimiters are consumed in front of every token
+_TOKEN = re.compile(
+    r"""
+    [\s$]*(?:
+    (?P<skip>\\SetKw\w*(?:\{[^{}]*\})+|\\DontPrintSemicolon|\\(?:begin|end)\{algorithm\*?\}|\\caption\{[^{}]*\})
+    |(?P<doc>\\KwResult\{(?P<doctext>[^{}]*)\})
+    |(?P<string>``(?P<strtext>.*?)'')
+    |(?P<cmd>\\math(?:bin|ord)\{\\?[^{}]*\}|\\not\\(?:equiv|in)(?![A-Za-z])|\\mathrm\{del\}|\\[A-Za-z]+|\\.)
+    |(?P<number>\d+\.?\d*(?:[eE][+-]?\d+)?)
+    |(?P<keyword>[A-Za-z_]\w*=(?!=))
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op>:=|[{}\[\](),+\-<>=^:.*!'])
+    )""",
+    re.S | re.X,
+)
+
+
+def tokenize(latex: str) -> list[Token]:
+    """Split in a single pass, whitespace, math delimiters and declarations are dropped"""
+    tokens = []
+    pos = 0
+    for m in _TOKEN.finditer(latex):
+        if m.start() != pos:
+            raise ParseError(f"Unexpected {latex[pos:m.start()]!r} at {pos}")
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "skip":
+            continue
+        if kind == "doc":
+            tokens.append(Token(kind, m.group("doctext")))
+        elif kind == "string":
+            tokens.append(Token(kind, m.group("strtext")))
+        else:
+            tokens.append(Token(kind, m.group(kind)))
+    if latex[pos:].replace("$", "").strip():
+        raise ParseError(f"Unexpected {latex[pos:pos + 20]!r} at {pos}")
+    return tokens
+
+
+# Precedences follow python, higher binds tighter
+_BOOL = {r"\mathbin{\lor}": (1, ast.Or), r"\land": (2, ast.And)}
+_NOT_OPERAND = 4
+_COMPARE = {
+    "=": ast.Eq,
+    r"\ne": ast.NotEq,
+    "<": ast.Lt,
+    r"\leq": ast.LtE,
+    ">": ast.Gt,
+    r"\geq": ast.GtE,
+    r"\equiv": ast.Is,
+    r"\not\equiv": ast.IsNot,
+    r"\in": ast.In,
+    r"\not\in": ast.NotIn,
+}
+_COMPARE_PREC = 4
+_BINARY = {
+    r"\mathbin{|}": (5, ast.BitOr),
+    r"\mathbin{\oplus}": (6, ast.BitXor),
+    r"\mathbin{\&}": (7, ast.BitAnd),
+    r"\ll": (8, ast.LShift),
+    r"\gg": (8, ast.RShift),
+    "+": (9, ast.Add),
+    "-": (9, ast.Sub),
+    r"\cdot": (10, ast.Mult),
+    r"\mod": (10, ast.Mod),
+    r"\times": (10, ast.MatMult),
+}
+_UNARY_PREC = 11
+_POW_PREC = 12
+
+_CONSTANTS = {r"\top": True, r"\bot": False, r"\blacktriangle": None}
+# Builtins that are printed as a symbol followed by their arguments
+_PREFIX_CALLS = {r"\forall": "all", r"\exists": "any", r"\min": "min", r"\max": "max"}
+# Builtins whose arguments are delimited
+_DELIMITED_CALLS = {
+    r"\lvert": ("len", r"\rvert"),
+    r"\lceil": ("ceil", r"\rceil"),
+    r"\lfloor": ("floor", r"\rfloor"),
+    r"\|": ("abs", r"\|"),
+}
+_SIMPLE_STATEMENTS = {r"\Break": ast.Break, r"\Continue": ast.Continue, r"\Pass": ast.Pass}
+_STATEMENTS = {
+    r"\If",
+    r"\ForAll",
+    r"\While",
+    r"\Fn",
+    r"\Switch",
+    r"\Case",
+    r"\Return",
+    r"\mathrm{del}",
+    *_SIMPLE_STATEMENTS,
+}
+_CLOSERS = {"}", "]", ")", r"\;", r"\gets", r"\rvert", r"\rceil", r"\rfloor", ",", ":"}
+# Receiver of method calls, it is not printed
+_RECEIVER = "_"
+
+
+def _store(node: ast.expr) -> ast.expr:
+    """Turn a parsed expression into an assignment target"""
+    if isinstance(node, ast.Tuple | ast.List):
+        for e in node.elts:
+            _store(e)
+    if isinstance(node, ast.Starred):
+        _store(node.value)
+    if hasattr(node, "ctx"):
+        node.ctx = ast.Store()
+    return node
+
+
+class _Parser:
+    def __init__(self, tokens: list[Token]) -> None:
+        self.tokens = tokens
+        self.pos = 0
+        # \| opens and closes abs, inside it can only close
+        self.in_abs = 0
+
+    def peek(self, offset=0) -> Token | None:
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def at(self, text: str, offset=0) -> bool:
+        tok = self.peek(offset)
+        return tok is not None and tok.kind not in ("string", "doc") and tok.text == text
+
+    def next(self) -> Token:
+        tok = self.peek()
+        if tok is None:
+            raise ParseError("Unexpected end of input")
+        self.pos += 1
+        return tok
+
+    def expect(self, text: str) -> Token:
+        tok = self.next()
+        if tok.text != text:
+            raise ParseError(f"Expected {text!r} but got {tok.text!r} at token {self.pos - 1}")
+        return tok
+
+    # Statements
+
+    def module(self) -> ast.Module:
+        body = self.statements(closed=False)
+        return ast.Module(body=body, type_ignores=[])
+
+    def statements(self, closed: bool) -> list[ast.stmt]:
+        body = []
+        while True:
+            if self.peek() is None:
+                if closed:
+                    raise ParseError("Unclosed block")
+                return body
+            if self.at("}") and closed:
+                self.next()
+                return body
+            if self.at(r"\;"):
+                self.next()
+                continue
+            body.append(self.statement())
+
+    def block(self) -> list[ast.stmt]:
+        self.expect("{")
+        return self.statements(closed=True)
+
+    def braced(self) -> ast.expr:
+        self.expect("{")
+        e = self.expr()
+        self.expect("}")
+        return e
+
+    def statement(self) -> ast.stmt:
+        tok = self.peek()
+        if tok.kind == "doc":
+            self.next()
+            return ast.Expr(ast.Constant(tok.text))
+        match tok.text if tok.kind == "cmd" else None:
+            case r"\If" | r"\While":
+                self.next()
+                test = self.braced()
+                body = self.block()
+                orelse = self.block() if self.at("{") else []
+                cls = ast.If if tok.text == r"\If" else ast.While
+                return cls(test=test, body=body, orelse=orelse)
+            case r"\ForAll":
+                self.next()
+                header = self.braced()
+                if not isinstance(header, ast.Compare) or not isinstance(header.ops[0], ast.In):
+                    raise ParseError("Expected target \\in iterable in \\ForAll")
+                if len(header.ops) == 1:
+                    iterable = header.comparators[0]
+                else:
+                    iterable = ast.Compare(header.comparators[0], header.ops[1:], header.comparators[1:])
+                body = self.block()
+                orelse = self.block() if self.at("{") else []
+                return ast.For(_store(header.left), iterable, body, orelse)
+            case r"\Fn":
+                return self.function()
+            case r"\Switch":
+                self.next()
+                subject = self.braced()
+                self.expect("{")
+                cases = []
+                while self.at(r"\Case"):
+                    self.next()
+                    pattern = self.braced()
+                    if isinstance(pattern, ast.Constant) and pattern.value in (True, False, None):
+                        pattern = ast.MatchSingleton(pattern.value)
+                    else:
+                        pattern = ast.MatchValue(pattern)
+                    cases.append(ast.match_case(pattern, None, self.block()))
+                self.expect("}")
+                return ast.Match(subject, cases)
+            case r"\Return":
+                self.next()
+                self.expect("{")
+                value = None if self.at("}") else self.expr()
+                self.expect("}")
+                return ast.Return(value)
+            case r"\mathrm{del}":
+                self.next()
+                targets = []
+                while self.starts_expr():
+                    targets.append(self.expr())
+                for t in targets:
+                    _store(t).ctx = ast.Del()
+                return ast.Delete(targets)
+            case cmd if cmd in _SIMPLE_STATEMENTS:
+                self.next()
+                return _SIMPLE_STATEMENTS[cmd]()
+        return self.simple_statement()
+
+    def function(self) -> ast.FunctionDef:
+        self.expect(r"\Fn")
+        self.expect("{")
+        name = self.next()
+        if name.kind != "cmd":
+            raise ParseError(f"Expected function name but got {name.text!r}")
+        self.expect("{")
+        args = []
+        while not self.at("}"):
+            tok = self.next()
+            if tok.text == ",":
+                continue
+            if tok.kind != "name":
+                raise ParseError(f"Expected argument name but got {tok.text!r}")
+            args.append(ast.arg(tok.text))
+        self.expect("}")
+        self.expect("}")
+        return ast.FunctionDef(
+            name=name.text[1:].lower(),
+            args=ast.arguments(posonlyargs=[], args=args, kwonlyargs=[], kw_defaults=[], defaults=[]),
+            body=self.block(),
+            decorator_list=[],
+        )
+
+    def simple_statement(self) -> ast.stmt:
+        targets, values = [], []
+        while self.starts_expr():
+            e = self.expr()
+            if not self.at(r"\gets"):
+                values.append(e)
+                continue
+            self.next()
+            targets.append(e)
+            tok = self.peek()
+            # x += 1 is printed as x \gets + 1
+            if tok is not None and tok.text in _BINARY:
+                self.next()
+                return ast.AugAssign(_store(e), _BINARY[tok.text][1](), self.expr())
+        if not values:
+            tok = self.peek()
+            raise ParseError(f"Unexpected {tok.text if tok else 'end of input'!r}")
+        # Subscript targets are printed without \gets so juxtaposed expressions are an assignment too
+        targets += values[:-1]
+        if targets:
+            return ast.Assign([_store(t) for t in targets], values[-1])
+        return ast.Expr(values[-1])
+
+    # Expressions
+
+    def starts_expr(self) -> bool:
+        tok = self.peek()
+        if tok is None:
+            return False
+        if tok.kind in ("name", "number", "string", "keyword"):
+            return True
+        if tok.text in _CLOSERS or tok.text in _STATEMENTS:
+            return False
+        if tok.text == r"\|" and self.in_abs:
+            return False
+        if tok.text in _BOOL or tok.text in _COMPARE or tok.text in _BINARY:
+            return False
+        return tok.kind == "cmd" or tok.text in ("(", "[", "*")
+
+    def expr(self, min_prec=0) -> ast.expr:
+        left = self.unary()
+        while True:
+            tok = self.peek()
+            if tok is None or tok.kind in ("string", "doc"):
+                return left
+            text = tok.text
+            if text == "^" and _POW_PREC >= min_prec:
+                self.next()
+                left = ast.BinOp(left, ast.Pow(), self.braced())
+            elif text in _BOOL and _BOOL[text][0] >= min_prec:
+                prec, op = _BOOL[text]
+                values = [left]
+                while self.at(text):
+                    self.next()
+                    values.append(self.expr(prec + 1))
+                left = ast.BoolOp(op(), values)
+            elif text in _COMPARE and _COMPARE_PREC >= min_prec:
+                ops, comparators = [], []
+                while self.peek() is not None and self.peek().text in _COMPARE:
+                    ops.append(_COMPARE[self.next().text]())
+                    comparators.append(self.expr(_COMPARE_PREC + 1))
+                left = ast.Compare(left, ops, comparators)
+            elif text in _BINARY and _BINARY[text][0] >= min_prec:
+                prec, op = _BINARY[text]
+                self.next()
+                left = ast.BinOp(left, op(), self.expr(prec + 1))
+            else:
+                return left
+
+    def unary(self) -> ast.expr:
+        if self.at(r"\neg"):
+            self.next()
+            return ast.UnaryOp(ast.Not(), self.expr(_NOT_OPERAND))
+        if self.at(r"\mathord{\sim}"):
+            self.next()
+            return ast.UnaryOp(ast.Invert(), self.expr(_UNARY_PREC))
+        if self.at("(") and (self.at("-", 1) or self.at("+", 1)):
+            self.next()
+            op = ast.USub() if self.next().text == "-" else ast.UAdd()
+            operand = self.expr()
+            self.expect(")")
+            return ast.UnaryOp(op, operand)
+        if self.at("*"):
+            self.next()
+            return ast.Starred(self.expr(_UNARY_PREC), ast.Load())
+        return self.postfix(self.atom())
+
+    def postfix(self, node: ast.expr) -> ast.expr:
+        while True:
+            # x [ ] can only be a list following x
+            if self.at("[") and not self.at("]", 1):
+                self.next()
+                index = self.expr()
+                self.expect("]")
+                node = ast.Subscript(node, index, ast.Load())
+            elif self.at(".") and self.peek(1) is not None and self.peek(1).kind == "name":
+                self.next()
+                node = ast.Attribute(node, self.next().text, ast.Load())
+            else:
+                return node
+
+    def sequence(self, close: str) -> list[ast.expr]:
+        """Comma separated elements up to close, targets inside are marked with \\gets"""
+        elts = []
+        while not self.at(close):
+            if self.at(",") or self.at(r"\gets"):
+                self.next()
+                continue
+            elts.append(self.expr())
+        self.expect(close)
+        return elts
+
+    def arguments(self, close: str) -> tuple[list, list]:
+        args, keywords = [], []
+        while not self.at(close):
+            tok = self.peek()
+            if tok is None:
+                raise ParseError(f"Expected {close!r}")
+            if tok.text == ",":
+                self.next()
+            elif tok.kind == "keyword":
+                self.next()
+                keywords.append(ast.keyword(tok.text[:-1], self.expr()))
+            else:
+                args.append(self.expr())
+        self.expect(close)
+        return args, keywords
+
+    def atom(self) -> ast.expr:
+        tok = self.next()
+        match tok.kind:
+            case "name":
+                return ast.Name(tok.text, ast.Load())
+            case "number":
+                value = tok.text
+                return ast.Constant(float(value) if any(c in value for c in ".eE") else int(value))
+            case "string":
+                return ast.Constant(tok.text)
+        text = tok.text
+        if text in _CONSTANTS:
+            return ast.Constant(_CONSTANTS[text])
+        if text == r"\emptyset":
+            return ast.Call(ast.Name("set", ast.Load()), [], [])
+        if text == "(":
+            return ast.Tuple(self.sequence(")"), ast.Load())
+        if text == "[":
+            return ast.List(self.sequence("]"), ast.Load())
+        if text == r"\{":
+            return self.set_or_dict()
+        if text == r"\frac":
+            return self.fraction()
+        if text == r"\lfloor" and self.at(r"\frac"):
+            self.next()
+            division = self.fraction()
+            self.expect(r"\rfloor")
+            division.op = ast.FloorDiv()
+            return division
+        if text in _DELIMITED_CALLS:
+            name, close = _DELIMITED_CALLS[text]
+            self.in_abs += name == "abs"
+            args, keywords = self.arguments(close)
+            self.in_abs -= name == "abs"
+            return ast.Call(ast.Name(name, ast.Load()), args, keywords)
+        if text in _PREFIX_CALLS:
+            args = []
+            while self.starts_expr():
+                args.append(self.expr())
+            return ast.Call(ast.Name(_PREFIX_CALLS[text], ast.Load()), args, [])
+        if text == r"\lambda":
+            return self.lambda_()
+        if text in (r"\Yield", r"\YieldFrom"):
+            self.expect("{")
+            value = None if self.at("}") else self.expr()
+            self.expect("}")
+            return ast.Yield(value) if text == r"\Yield" else ast.YieldFrom(value)
+        if tok.kind == "cmd" and text[1:].isalnum():
+            if not self.at("{"):
+                return ast.Name(text[1:], ast.Load())
+            self.next()
+            args, keywords = self.arguments("}")
+            if text[1].islower():
+                # Method calls only print the attribute
+                func = ast.Attribute(ast.Name(_RECEIVER, ast.Load()), text[1:], ast.Load())
+            else:
+                func = ast.Name(text[1:].lower(), ast.Load())
+            return ast.Call(func, args, keywords)
+        raise ParseError(f"Unexpected {text!r} at token {self.pos - 1}")
+
+    def set_or_dict(self) -> ast.expr:
+        keys, values, elts = [], [], []
+        while not self.at(r"\}"):
+            if self.at(","):
+                self.next()
+                continue
+            e = self.expr()
+            if self.at(r"\mapsto"):
+                self.next()
+                keys.append(e)
+                values.append(self.expr())
+            else:
+                elts.append(e)
+        self.expect(r"\}")
+        if keys and elts:
+            raise ParseError("Mixed set and dict")
+        return ast.Dict(keys, values) if keys else ast.Set(elts)
+
+    def fraction(self) -> ast.BinOp:
+        numerator = self.braced()
+        return ast.BinOp(numerator, ast.Div(), self.braced())
+
+    def lambda_(self) -> ast.Lambda:
+        args = []
+        while not self.at(":"):
+            tok = self.next()
+            if tok.text == ",":
+                continue
+            if tok.kind != "name":
+                raise ParseError(f"Expected argument name but got {tok.text!r}")
+            args.append(ast.arg(tok.text))
+        self.expect(":")
+        arguments = ast.arguments(posonlyargs=[], args=args, kwonlyargs=[], kw_defaults=[], defaults=[])
+        return ast.Lambda(arguments, self.expr())
+
+
+def _number_lines(body: list[ast.stmt], lineno: int) -> int:
+    """Put every statement on its own line so that Python2Algorithm lays the output out the same way"""
+    for stmt in body:
+        lineno += 1
+        stmt.lineno = stmt.end_lineno = lineno
+        for field in ("body", "orelse"):
+            lineno = _number_lines(getattr(stmt, field, []), lineno)
+        for case in getattr(stmt, "cases", []):
+            lineno = _number_lines(case.body, lineno)
+    return lineno
+
+
+def untranslate(latex: str | list[Token]) -> ast.Module:
+    """Parse algorithm2e produced by Python2Algorithm (or its tokens) into a python AST"""
+    tokens = tokenize(latex) if isinstance(latex, str) else latex
+    module = _Parser(tokens).module()
+    _number_lines(module.body, 0)
+    return ast.fix_missing_locations(module)
+
+
+def skeleton(node: ast.AST) -> tuple:
+    """
+    Statement structure as far as it survives the translation.
+    Function names are normalized like Python2Algorithm does and all assignments look alike.
+    """
+    match node:
+        case ast.Module(body=body):
+            return tuple(skeleton(s) for s in body)
+        case ast.FunctionDef(name=name, args=args, body=body):
+            nargs = len(args.posonlyargs) + len(args.args) + len(args.kwonlyargs)
+            return ("def", normalize_function_name(name), nargs, skeleton(ast.Module(body)))
+        case ast.For(body=body, orelse=orelse) | ast.While(body=body, orelse=orelse) | ast.If(
+            body=body, orelse=orelse
+        ):
+            kind = type(node).__name__.lower()
+            return (kind, skeleton(ast.Module(body)), skeleton(ast.Module(orelse)))
+        case ast.Match(cases=cases):
+            return ("match", tuple(skeleton(ast.Module(c.body)) for c in cases))
+        case ast.Assign() | ast.AugAssign() | ast.AnnAssign():
+            return ("assign",)
+        case ast.Expr(value=ast.Yield() | ast.YieldFrom() as value):
+            return (type(value).__name__.lower(),)
+        case ast.Expr(value=ast.Constant(value=str())):
+            return ("string",)
+        case _:
+            return (type(node).__name__.lower(),)
+
+
+def _function_name(name: str) -> str:
+    # Python2Algorithm capitalizes and untranslate lowercases
+    return normalize_function_name(name).lower()
+
+
+class _Normalize(ast.NodeTransformer):
+    """Apply the documented losses of the translation to an AST"""
+
+    def visit_Module(self, node: ast.Module):
+        docstring = ast.get_docstring(node)
+        self.generic_visit(node)
+        if docstring is not None:
+            node.body[0] = ast.Expr(ast.Constant(docstring))
+        return node
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        node.name = _function_name(node.name)
+        return self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node: ast.Call):
+        self.generic_visit(node)
+        match node:
+            case ast.Call(func=ast.Name(id="set"), args=[ast.Tuple() | ast.List() | ast.Set() as arg]):
+                return ast.Set(arg.elts)
+            case ast.Call(func=ast.Name() as func):
+                func.id = _function_name(func.id)
+            case ast.Call(func=ast.Attribute() as func):
+                func.value = ast.Name(_RECEIVER, ast.Load())
+        return node
+
+
+def _headers(body: list, out: list) -> list:
+    """Every statement and match case without its nested statements, in source order"""
+    for node in body:
+        header = copy.copy(node)
+        for field in ("body", "orelse", "cases"):
+            if hasattr(header, field):
+                setattr(header, field, [])
+        out.append(header)
+        for field in ("body", "orelse", "cases"):
+            _headers(getattr(node, field, []), out)
+    return out
+
+
+class RoundTrip(NamedTuple):
+    ok: bool
+    # Why the round trip failed
+    reason: str = ""
+
+
+def _translate(tree: ast.AST, cache: FragmentCache | None) -> str:
+    out = io.StringIO()
+    Python2Algorithm(output=out, cache=cache).visit(tree)
+    return out.getvalue()
+
+
+def roundtrip(source: str, cache: FragmentCache | None = None) -> RoundTrip:
+    """Check python -> algorithm2e -> python for source"""
+    tree = ast.parse(source, mode="exec")
+    try:
+        latex = _translate(tree, cache)
+    except Exception as e:
+        return RoundTrip(False, f"translation failed: {type(e).__name__}: {e}")
+    try:
+        reparsed = untranslate(latex)
+    except ParseError as e:
+        return RoundTrip(False, f"parse failed: {e}")
+    if skeleton(reparsed) != skeleton(tree):
+        return RoundTrip(False, "statement structure differs")
+    expected = _headers(_Normalize().visit(tree).body, [])
+    actual = _headers(_Normalize().visit(reparsed).body, [])
+    for original, back in zip(expected, actual):
+        if ast.dump(original) != ast.dump(back):
+            line = getattr(original, "lineno", "?")
+            before = ast.unparse(original).splitlines()[0]
+            after = ast.unparse(back).splitlines()[0]
+            return RoundTrip(False, f"line {line}: {before!r} came back as {after!r}")
+    return RoundTrip(True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args()
+    failed = 0
+    for path in args.files:
+        with open(path) as f:
+            result = roundtrip(f.read())
+        if not result.ok:
+            failed += 1
+            print(f"{path}: {result.reason}")
+    print(f"{len(args.files)} checked, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
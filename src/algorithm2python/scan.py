@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Scan python sources for constructs Python2Algorithm can't translate.
+Run this before a big docs build to know what will fail.
+Every file is parsed once and walked without translating anything, files are scanned in parallel.
+Findings are reported per file and per function in three categories:
+- missing: node types without a visitor. generic_visit flattens or drops them.
+- raises: constructs that make the translation fail with an exception
+- drops: content that the existing visitors silently leave out
+"""
+import argparse
+import ast
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from algorithm2python.python2algorithm import Python2Algorithm
+
+MODULE_SCOPE = "<module>"
+CATEGORIES = ("missing", "raises", "drops")
+
+# Nodes without a visitor that are still translated correctly.
+# Operators and contexts are matched by their parent, Expr just wraps an expression.
+_IMPLICIT = (
+    ast.Expr,
+    ast.expr_context,
+    ast.operator,
+    ast.boolop,
+    ast.cmpop,
+    ast.unaryop,
+)
+# Constant values that visit_Constant renders
+_CONSTANTS = (bool, int, str, float, frozenset, tuple, type(None))
+
+
+class FileReport(NamedTuple):
+    path: str
+    # scope -> category -> Counter of findings
+    scopes: dict
+    # Set if the file could not be read or parsed
+    error: str | None = None
+
+    def count(self, category: str) -> int:
+        return sum(sum(s[category].values()) for s in self.scopes.values())
+
+
+def _has_visitor(node_type: type) -> bool:
+    return hasattr(Python2Algorithm, "visit_" + node_type.__name__)
+
+
+# Checks for nodes the visitors handle badly. Each yields (category, description).
+# Dispatching on the node type keeps the walk cheap for the many nodes without a check.
+
+
+def _check_value(node):
+    if node.value is None:
+        yield "raises", type(node).__name__ + " without value"
+
+
+def _check_scope_statement(node):
+    yield "raises", type(node).__name__
+
+
+def _check_match_case(node):
+    if node.guard is None:
+        yield "raises", "case without guard"
+
+
+def _check_constant(node):
+    if not isinstance(node.value, _CONSTANTS):
+        yield "raises", "Constant of type " + type(node.value).__name__
+
+
+def _check_call(node):
+    match node:
+        case ast.Call(func=ast.Name(id="set"), args=[arg, *_]) if not hasattr(arg, "elts"):
+            yield "raises", "set() of " + type(arg).__name__
+        case ast.Call(func=ast.Name()):
+            pass
+        case ast.Call(func=ast.Attribute()):
+            # Only the method name is printed
+            yield "drops", "method receiver"
+        case _:
+            yield "drops", "callee " + type(node.func).__name__
+
+
+def _check_name(node):
+    if isinstance(node.ctx, ast.Del):
+        yield "drops", "deleted name"
+
+
+def _check_keyword(node):
+    if node.arg is None:
+        yield "drops", "**kwargs"
+
+
+def _check_function(node):
+    if node.decorator_list:
+        yield "drops", "decorator"
+    if node.returns is not None:
+        yield "drops", "return annotation"
+
+
+def _check_annassign(node):
+    if node.value is None:
+        yield "raises", "AnnAssign without value"
+    else:
+        yield "drops", "annotation"
+
+
+def _check_dict(node):
+    # visit_Dict visits every key and ** unpacking has None as key
+    if None in node.keys:
+        yield "raises", "dict unpacking"
+
+
+def _check_arg(node):
+    if node.annotation is not None:
+        yield "drops", "annotation"
+
+
+def _check_arguments(node):
+    if node.vararg or node.kwarg:
+        yield "drops", "*args/**kwargs"
+    if node.defaults or any(node.kw_defaults):
+        yield "drops", "default value"
+
+
+_CHECKS = {
+    ast.Return: _check_value,
+    ast.Yield: _check_value,
+    ast.Global: _check_scope_statement,
+    ast.Nonlocal: _check_scope_statement,
+    ast.match_case: _check_match_case,
+    ast.Constant: _check_constant,
+    ast.Call: _check_call,
+    ast.Name: _check_name,
+    ast.keyword: _check_keyword,
+    ast.FunctionDef: _check_function,
+    ast.AnnAssign: _check_annassign,
+    ast.Dict: _check_dict,
+    ast.arg: _check_arg,
+    ast.arguments: _check_arguments,
+}
+_SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+# Fields the translator never visits. Their parents report them as dropped,
+# anything inside can't make the translation fail.
+_UNVISITED = frozenset(("defaults", "kw_defaults", "annotation", "returns", "decorator_list"))
+
+
+def _is_missing(node_type: type) -> bool:
+    return not issubclass(node_type, _IMPLICIT) and not _has_visitor(node_type)
+
+
+def scan_tree(tree: ast.AST) -> dict:
+    scopes = {}
+    # node type -> whether it has no visitor, filled on first sight
+    missing = {}
+
+    def report(scope, category, description):
+        if scope not in scopes:
+            scopes[scope] = {c: Counter() for c in CATEGORIES}
+        scopes[scope][category][description] += 1
+
+    stack = [(tree, MODULE_SCOPE)]
+    while stack:
+        node, scope = stack.pop()
+        node_type = type(node)
+        if node_type in _SCOPES:
+            scope = node.name if scope == MODULE_SCOPE else scope + "." + node.name
+        is_missing = missing.get(node_type)
+        if is_missing is None:
+            is_missing = missing[node_type] = _is_missing(node_type)
+        if is_missing:
+            report(scope, "missing", node_type.__name__)
+        check = _CHECKS.get(node_type)
+        if check is not None:
+            for category, description in check(node):
+                report(scope, category, description)
+        # Inlined ast.iter_child_nodes, this loop dominates the scan
+        for field in node._fields:
+            if field in _UNVISITED:
+                continue
+            if field == "func" and node_type is ast.Call and type(node.func) is not ast.Name:
+                # Only the method name of the callee is printed, see _check_call
+                continue
+            child = getattr(node, field, None)
+            if isinstance(child, list):
+                for c in child:
+                    if isinstance(c, ast.AST):
+                        stack.append((c, scope))
+            elif isinstance(child, ast.AST):
+                stack.append((child, scope))
+    return scopes
+
+
+def scan_file(path: str) -> FileReport:
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), filename=path)
+    except (OSError, SyntaxError, ValueError) as e:
+        return FileReport(path, {}, f"{type(e).__name__}: {e}")
+    return FileReport(path, scan_tree(tree))
+
+
+def find_sources(paths) -> list[str]:
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(".") and d != "__pycache__")
+            files.extend(os.path.join(root, n) for n in sorted(names) if n.endswith(".py"))
+    return files
+
+
+def scan(paths, workers: int | None = None) -> list[FileReport]:
+    """Scan files and directories, directories are searched recursively for .py files"""
+    files = find_sources(paths)
+    workers = workers or os.cpu_count() or 1
+    # Starting processes costs more than scanning a handful of files
+    if workers == 1 or len(files) < 64:
+        return [scan_file(f) for f in files]
+    chunksize = max(1, len(files) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(scan_file, files, chunksize=chunksize))
+
+
+def format_report(report: FileReport) -> list[str]:
+    if report.error:
+        return [f"{report.path}: error {report.error}"]
+    lines = []
+    for scope in sorted(report.scopes):
+        parts = []
+        for category in CATEGORIES:
+            found = report.scopes[scope][category]
+            if found:
+                items = (d if n == 1 else f"{d} x{n}" for d, n in sorted(found.items()))
+                parts.append(category + " " + ", ".join(items))
+        lines.append(f"{report.path}:{scope}: " + "; ".join(parts))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    args = parser.parse_args()
+    reports = scan(args.paths, args.jobs)
+    for report in reports:
+        for line in format_report(report):
+            print(line)
+    failing = sum(1 for r in reports if r.error or r.count("raises"))
+    print(f"{len(reports)} files scanned, {failing} would fail", file=sys.stderr)
+    return 1 if failing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
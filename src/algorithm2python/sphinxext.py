@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Sphinx extension providing the algorithm directive.
+Add "algorithm2python.sphinxext" to the extensions in conf.py and write
+
+.. algorithm:: pkg.mod:func
+   :caption: Euler tour
+   :preview:
+
+The LaTeX builder gets the algorithm2e code, other builders show the source and with :preview: a link to a pdf.
+Renderings are cached in algorithm2python_cache_dir (.algorithm2python-cache next to conf.py by default).
+"""
+import os
+
+from docutils import nodes
+from docutils.parsers.rst import directives
+from sphinx import addnodes
+from sphinx.util import logging
+from sphinx.util.docutils import SphinxDirective
+
+from algorithm2python import __version__
+from algorithm2python.docs import Renderer, find_source
+
+logger = logging.getLogger(__name__)
+
+
+def _renderer(app) -> Renderer:
+    renderer = getattr(app, "_algorithm2python_renderer", None)
+    if renderer is None:
+        cache_dir = app.config.algorithm2python_cache_dir or os.path.join(
+            app.confdir, ".algorithm2python-cache"
+        )
+        renderer = app._algorithm2python_renderer = Renderer(cache_dir)
+    return renderer
+
+
+class AlgorithmDirective(SphinxDirective):
+    required_arguments = 1
+    option_spec = {"caption": directives.unchanged, "preview": directives.flag}
+
+    def run(self):
+        target = self.arguments[0]
+        options = {"caption": self.options["caption"]} if "caption" in self.options else {}
+        renderer = _renderer(self.env.app)
+        hits, misses = renderer.stats()
+        path = None
+        try:
+            path, _ = find_source(target)
+            latex = renderer.render(target, options)
+            pdf = renderer.preview(target, options, latex) if "preview" in self.options else None
+        except Exception as e:
+            # Unsupported constructs should not abort the whole build
+            logger.warning(f"algorithm {target}: {type(e).__name__}: {e}", location=self.get_location())
+            return []
+        finally:
+            if path is not None:
+                # Re-read the document when the module changes, also to retry after a failure
+                self.env.note_dependency(path)
+            new_hits, new_misses = renderer.stats()
+            # Counted per document so merging parallel readers can't count anything twice
+            stats = self.env.algorithm2python_stats.setdefault(self.env.docname, [0, 0])
+            stats[0] += new_hits - hits
+            stats[1] += new_misses - misses
+
+        latex_only = addnodes.only(expr="latex")
+        latex_only += nodes.raw("", latex, format="latex")
+        other = addnodes.only(expr="not latex")
+        other += nodes.literal_block(latex, latex, language="latex")
+        if pdf is not None:
+            name = target.replace(":", ".") + ".pdf"
+            directory = os.path.join(self.env.app.outdir, "_algorithms")
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, name), "wb") as f:
+                f.write(pdf)
+            uri = "../" * self.env.docname.count("/") + "_algorithms/" + name
+            paragraph = nodes.paragraph()
+            paragraph += nodes.reference("", "Preview (pdf)", refuri=uri)
+            other += paragraph
+        return [latex_only, other]
+
+
+def reset_stats(app, env, docnames):
+    # docname -> [hits, misses] of the documents read in this build
+    env.algorithm2python_stats = {}
+
+
+def merge_stats(app, env, docnames, other):
+    # A reader process forked after earlier merges inherits their counts, only take its own documents
+    for docname in docnames:
+        if docname in other.algorithm2python_stats:
+            env.algorithm2python_stats[docname] = other.algorithm2python_stats[docname]
+
+
+def report_stats(app, exception):
+    stats = getattr(app.env, "algorithm2python_stats", None)
+    if exception is None and stats is not None:
+        hits = sum(s[0] for s in stats.values())
+        misses = sum(s[1] for s in stats.values())
+        logger.info(f"algorithm2python cache: {hits} hits, {misses} misses")
+
+
+def setup(app):
+    app.add_config_value("algorithm2python_cache_dir", None, "env")
+    app.add_directive("algorithm", AlgorithmDirective)
+    app.add_latex_package("algorithm2e")
+    app.connect("env-before-read-docs", reset_stats)
+    app.connect("env-merge-info", merge_stats)
+    app.connect("build-finished", report_stats)
+    return {
+        "version": __version__,
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
@@ -1,10 +1,29 @@
 #!/usr/bin/env python3
 import pytest
 import ast
+import io
+import json
+import os
 import re
+import subprocess
+import time
+from types import SimpleNamespace
 
 import algorithm2python.main as main
-from algorithm2python.python2algorithm import Python2Algorithm
+from algorithm2python.python2algorithm import (
+    KeywordPreamble,
+    Python2Algorithm,
+    render_algorithms,
+)
+from algorithm2python.cache import DiskCache, FragmentCache
+from algorithm2python.highlight import highlight
+from algorithm2python.assemble import assemble, include_name
+from algorithm2python.assemble import main as assemble_main
+from algorithm2python.scan import scan
+from algorithm2python.docs import Renderer
+from algorithm2python.reverse import RoundTrip, roundtrip, untranslate
+from algorithm2python.revdiff import diff, render
+from algorithm2python.notebook import convert, translate_cell
 
 
 def test_main_succeeds():
@@ -46,3 +65,321 @@ def test_lambda():
     with open("test_output", "r") as f:
         tex = "\n".join(f.readlines())
         assert "\\lambda x : x ^{ 2 }" in tex
+
+
+def test_memoized_rendering_matches_uncached():
+    with open("src/sample/colorful.py") as f:
+        tree = ast.parse(f.read(), mode="exec")
+    cached, uncached = io.StringIO(), io.StringIO()
+    p2a = Python2Algorithm(output=cached, cache=FragmentCache())
+    p2a.visit(tree)
+    Python2Algorithm(output=uncached).visit(tree)
+    assert cached.getvalue() == uncached.getvalue()
+    assert p2a.cache.info().hits > 0
+    disabled = FragmentCache(maxsize=0)
+    Python2Algorithm(output=io.StringIO(), cache=disabled).visit(tree)
+    assert disabled.info() == (0, 0, 0, 0)
+
+
+def test_fragment_cache_is_bounded():
+    cache = FragmentCache(maxsize=2)
+    for key in "abc":
+        cache.put(key, key)
+    assert cache.get("a") is None
+    assert cache.get("c") == "c"
+    info = cache.info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 2)
+    assert info.hit_rate == 0.5
+
+
+def test_highlight_is_cached_by_content(tmp_path):
+    source = "def f(x):\n    return x\n"
+    fragment = highlight(source, cache_dir=tmp_path)
+    assert "\\begin{Verbatim}" in fragment
+    assert len(list(tmp_path.iterdir())) == 1
+    assert highlight(source, cache_dir=tmp_path) == fragment
+    highlight(source + "f(1)\n", cache_dir=tmp_path)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_shared_keyword_preamble():
+    trees = [ast.parse("print(x)\nbreak"), ast.parse("print(y)\nfoo(y)")]
+    shared, bodies = render_algorithms(trees)
+    assert shared.count("\\SetKw{Break}") == 1
+    assert shared.count("\\SetKwFunction{Print}{Print}") == 1
+    assert "\\SetKwFunction{Foo}{Foo}" in shared
+    assert all("\\SetKw" not in body for body in bodies)
+
+    preamble = KeywordPreamble()
+    preamble.collect(trees[0])
+    out = io.StringIO()
+    Python2Algorithm(output=out, preamble=preamble).visit(ast.parse("print(z)\nbar(z)"))
+    assert "\\SetKwFunction{Bar}{Bar}" in out.getvalue()
+    assert "\\SetKwFunction{Print}" not in out.getvalue()
+
+
+def test_assemble_includeonly_changed(tmp_path):
+    first, second = tmp_path / "first.py", tmp_path / "second.py"
+    first.write_text("x = 1\n")
+    second.write_text("y = 2\n")
+    out = tmp_path / "out"
+    sources = [str(first), str(second)]
+    names = [include_name(s) for s in sources]
+    assert assemble(sources, str(out)) == names
+    assert "\\includeonly" not in (out / "main.tex").read_text()
+    # Pretend TeX processed every part after it was written
+    now = time.time()
+    for name in names:
+        os.utime(out / (name + ".tex"), (now - 10, now - 10))
+        (out / (name + ".aux")).write_text("")
+        os.utime(out / (name + ".aux"), (now - 5, now - 5))
+    assert assemble(sources, str(out)) == []
+    assert "\\includeonly" not in (out / "main.tex").read_text()
+    second.write_text("y = 3\n")
+    assert assemble(sources, str(out)) == names[1:]
+    # Without a TeX run in between the edited part stays stale
+    assert assemble(sources, str(out)) == names[1:]
+    assert "\\includeonly{" + names[1] + "}" in (out / "main.tex").read_text()
+
+
+def test_assemble_cli_auxdir(tmp_path, monkeypatch, capsys):
+    source = tmp_path / "first.py"
+    source.write_text("x = 1\n")
+    out, aux = tmp_path / "out", tmp_path / "aux"
+    argv = ["assemble", str(out), str(source), "--auxdir", str(aux)]
+    monkeypatch.setattr("sys.argv", argv)
+    assemble_main()
+    aux.mkdir()
+    (aux / (include_name(str(source)) + ".aux")).write_text("")
+    os.utime(aux / (include_name(str(source)) + ".aux"), (time.time() + 10, time.time() + 10))
+    assemble_main()
+    assert capsys.readouterr().err.splitlines() == [include_name(str(source))]
+
+
+def test_algorithm_decorator_is_lazy(tmp_path, monkeypatch):
+    module = tmp_path / "lazy_sample.py"
+    module.write_text(
+        "from algorithm2python import algorithm\n\n"
+        "@algorithm\ndef double(x):\n    return 2 * x\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import lazy_sample
+
+    assert lazy_sample.double._latex is None
+    assert lazy_sample.double(2) == 4
+    latex = lazy_sample.double.__latex__
+    assert "\\Fn{\\Double{" in latex
+    assert lazy_sample.double.__latex__ is latex
+    module.write_text(
+        module.read_text()
+        .replace("\n\n@algorithm", '\n\n"""doc"""\n\n\n@algorithm')
+        .replace("2 * x", "x + x")
+    )
+    latex = lazy_sample.double.__latex__
+    assert "doc" not in latex
+    assert "x + x" in latex
+
+
+def test_algorithm_decorator_on_methods(tmp_path, monkeypatch):
+    (tmp_path / "method_sample.py").write_text(
+        "from algorithm2python import algorithm\n\n"
+        "class Counter:\n    @algorithm\n    def add(self, x):\n        return x + 1\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import method_sample
+
+    counter = method_sample.Counter()
+    assert counter.add(1) == 2
+    assert "\\Fn{\\Add{" in counter.add.__latex__
+
+
+def test_scan_reports_unsupported_constructs(tmp_path):
+    (tmp_path / "sample.py").write_text(
+        "import os\n\n"
+        "def f(x, *args):\n"
+        "    try:\n"
+        "        return\n"
+        "    except E:\n"
+        "        del x\n"
+        "    y: int\n"
+        "    stack.append(b'x'.decode())\n"
+        "    h[0](x)\n"
+        "    return {**x, 'k': y}\n"
+        "\n"
+        "def g(a=b'x', *, b: b'y' = ...) -> b'z':\n"
+        "    pass\n"
+    )
+    (tmp_path / "broken.py").write_text("def (:\n")
+    reports = {os.path.basename(r.path): r for r in scan([str(tmp_path)])}
+    assert reports["broken.py"].error.startswith("SyntaxError")
+    scopes = reports["sample.py"].scopes
+    assert scopes["<module>"]["missing"]["Import"] == 1
+    assert scopes["f"]["missing"]["Try"] == 1
+    assert scopes["f"]["raises"] == {
+        "Return without value": 1,
+        "AnnAssign without value": 1,
+        "dict unpacking": 1,
+    }
+    assert scopes["f"]["drops"] == {
+        "*args/**kwargs": 1,
+        "deleted name": 1,
+        "method receiver": 2,
+        "callee Subscript": 1,
+    }
+    # Defaults and annotations are never translated
+    assert scopes["g"]["raises"] == {}
+    assert scopes["g"]["drops"] == {"annotation": 1, "default value": 1, "return annotation": 1}
+
+
+def test_docs_renderer_caches_across_builds(tmp_path, monkeypatch):
+    module = tmp_path / "docs_sample.py"
+    module.write_text(
+        "def double(x):\n    return 2 * x\n\n"
+        "class Graph:\n    def size(self):\n        return len(self)\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    cache_dir = str(tmp_path / "cache")
+    latex = Renderer(cache_dir).render("docs_sample:double")
+    assert latex.startswith("\\begin{algorithm}")
+    assert "\\Fn{\\Double{" in latex
+
+    # A new build with a fresh renderer reuses the result
+    renderer = Renderer(cache_dir)
+    assert renderer.render("docs_sample:double") == latex
+    renderer.render("docs_sample:Graph.size")
+    assert renderer.stats() == (1, 1)
+    renderer.render("docs_sample:double", {"caption": "Double"})
+    assert renderer.stats() == (1, 2)
+
+    module.write_text(module.read_text().replace("2 * x", "x + x"))
+    assert renderer.render("docs_sample:double") != latex
+    with pytest.raises(ValueError):
+        renderer.render("docs_sample:missing")
+
+
+def test_sphinx_directive(tmp_path, monkeypatch):
+    pytest.importorskip("sphinx")
+    from sphinx.application import Sphinx
+
+    from algorithm2python.sphinxext import merge_stats
+
+    (tmp_path / "sphinx_sample.py").write_text(
+        "def double(x):\n    return 2 * x\n\ndef stop():\n    return\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "conf.py").write_text('extensions = ["algorithm2python.sphinxext"]\n')
+    (src / "index.rst").write_text(
+        ".. algorithm:: sphinx_sample:double\n   :caption: Double\n\n"
+        ".. algorithm:: sphinx_sample:stop\n"
+    )
+    out = tmp_path / "out"
+    warnings = io.StringIO()
+    app = Sphinx(
+        str(src), str(src), str(out), str(tmp_path / "doctrees"), "text", status=None, warning=warnings
+    )
+    app.build()
+    assert "\\Fn{\\Double{" in (out / "index.txt").read_text()
+    # The translator can't handle a bare return, the build goes on with a warning
+    assert "sphinx_sample:stop: AttributeError" in warnings.getvalue()
+    assert app.env.algorithm2python_stats == {"index": [0, 2]}
+
+    # A reader forked after "index" was merged still has its counts
+    env = SimpleNamespace(algorithm2python_stats={"index": [0, 1]})
+    worker = SimpleNamespace(algorithm2python_stats={"index": [0, 1], "other": [2, 0]})
+    merge_stats(app, env, {"other"}, worker)
+    assert env.algorithm2python_stats == {"index": [0, 1], "other": [2, 0]}
+
+
+def test_untranslate_fraction():
+    tree = untranslate(r"$y \gets 1 + \frac{ 2 }{ 5 + x } $ \;")
+    assert ast.unparse(tree) == "y = 1 + 2 / (5 + x)"
+
+
+@pytest.mark.parametrize("sample", ["bench", "colorful", "hierholzer"])
+def test_roundtrip_samples(sample):
+    with open(f"src/sample/{sample}.py") as f:
+        source = f.read()
+    # Imports are not translated at all
+    source = source.replace("from math import floor, ceil\n", "")
+    assert roundtrip(source) == RoundTrip(True)
+
+
+def test_roundtrip_reports_dropped_statements():
+    result = roundtrip("import os\nx = 1")
+    assert not result.ok
+    assert "structure" in result.reason
+
+
+@pytest.mark.parametrize("source", ["x = a - (b - c)", "x = (1 + 2) * 3"])
+def test_roundtrip_reports_changed_meaning(source):
+    result = roundtrip(source)
+    assert not result.ok
+    assert result.reason.startswith("line 1: ")
+
+
+def test_revdiff_only_changed_functions(tmp_path):
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args],
+            cwd=tmp_path,
+            check=True,
+            capture_output=True,
+        )
+
+    git("init", "-q")
+    (tmp_path / "a.py").write_text("def f(x):\n    return x\n\ndef g(x):\n    return 1\n")
+    (tmp_path / "b.py").write_text("def h(x):\n    return x\n")
+    git("add", ".")
+    git("commit", "-qm", "old")
+    # Reformatting g is not a change
+    (tmp_path / "a.py").write_text("def f(x):\n    return x + 1\n\ndef g( x ):\n    return 1\n\ndef k(y):\n    pass\n")
+    (tmp_path / "py2.py").write_text('print "py2"\n')
+    # Not UTF-8 and no encoding declaration
+    (tmp_path / "latin.py").write_bytes(b"x = '\xe9'\n")
+    git("add", ".")
+    git("commit", "-qam", "new")
+
+    changes = diff("HEAD~", "HEAD", str(tmp_path))
+    assert [(c.path, c.qualname, c.status) for c in changes] == [
+        ("a.py", "f", "modified"),
+        ("a.py", "k", "added"),
+        ("latin.py", "", "skipped"),
+        ("py2.py", "", "skipped"),
+    ]
+    assert changes[2].error.startswith("SyntaxError")
+    tex = render(changes)
+    assert tex.count("\\begin{algorithm}") == 3
+    assert "py2.py could not be parsed" in tex
+    assert "\\Fn{\\K{" in tex
+
+
+def test_notebook_retranslates_only_edited_cells(tmp_path):
+    def write(sources):
+        cells = [{"cell_type": "markdown", "metadata": {}, "source": ["# Title"]}]
+        for i, source in enumerate(sources):
+            tags = ["export"] if i < 2 else []
+            cells.append(
+                {"cell_type": "code", "id": f"c{i}", "metadata": {"tags": tags}, "source": source}
+            )
+        (tmp_path / "nb.ipynb").write_text(json.dumps({"cells": cells}))
+
+    write(["x = 1\n", ["%matplotlib inline\n", "y = 2\n"], "z = 3\n"])
+    cache = DiskCache(str(tmp_path / "cache"), suffix=".json")
+    algorithms = convert(str(tmp_path / "nb.ipynb"), str(tmp_path), tag="export", cache=cache)
+    assert [(a.cell.index, a.error) for a in algorithms] == [(1, None), (2, None)]
+    tex = (tmp_path / "nb.tex").read_text()
+    assert "\\caption{Cell 2}" in tex
+    assert "z \\gets" not in tex
+
+    write(["x = 1\n", "y = 4\n", "z = 3\n"])
+    convert(str(tmp_path / "nb.ipynb"), str(tmp_path), tag="export", cache=cache)
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_notebook_keeps_percent_inside_logical_lines():
+    latex, error = translate_cell("%time\nok = (a\n      != b)\ns = \"\"\"\n%x\n\"\"\"\n")
+    assert error is None
+    assert "\\ne" in latex
+    assert "%x" in latex and "#%x" not in latex